@@ -1,5 +1,6 @@
 # main.py (robust consumer for runner.run_debug)
 import os
+import sys
 import asyncio
 from dotenv import load_dotenv
 
@@ -15,7 +16,9 @@ print("✅ API key loaded successfully!\n")
 # ADK imports
 from google.adk.agents import Agent
 from google.adk.runners import InMemoryRunner
-from google.adk.tools import google_search
+# shared local retrieval tool (set USE_LOCAL_SEARCH=TRUE to search the local index instead of the web)
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from local_retrieval import search_tool
 
 # Create agent + runner (set app_name to silence mismatch warning if desired)
 root_agent = Agent(
@@ -23,7 +26,7 @@ root_agent = Agent(
     model="gemini-2.5-pro",
     description="An academic-grade assistant leveraging Gemini 2.5 Pro to analyze, cross-reference, and articulate knowledge from verified online sources.",
     instruction="You are an academic research assistant. Provide structured, well-cited, and context-aware responses. When searching the web, prioritize credible sources and synthesize findings clearly.",
-    tools=[google_search],
+    tools=[search_tool()],
 )
 
 # Option: give runner the same app_name as the agent package to avoid warning
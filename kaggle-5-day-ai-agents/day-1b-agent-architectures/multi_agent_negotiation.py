@@ -1,5 +1,5 @@
 # multi_agent_negotiation.py
-import os, asyncio
+import os, sys, asyncio
 from dotenv import load_dotenv
 load_dotenv()
 
@@ -12,6 +12,13 @@ os.environ["GOOGLE_GENAI_USE_VERTEXAI"] = os.getenv("GOOGLE_GENAI_USE_VERTEXAI",
 from google.adk.agents import Agent
 from google.adk.runners import InMemoryRunner
 
+# shared context-prefix cache (set USE_CONTEXT_CACHE=TRUE to reuse cached instruction/tool prefixes)
+# NOTE: the proposer instruction alone is far below Gemini's caching minimum, so nothing is cached
+# unless CONTEXT_CACHE_PINNED adds shared reference context; the hooks show where caching plugs in.
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from prefix_cache import get_prefix_cache
+prefix_cache = get_prefix_cache()
+
 def extract_text_from_obj(obj):
     try:
         if isinstance(obj, str): return obj
@@ -40,7 +47,9 @@ async def handle_resp(resp):
 # Define three proposer agents and one judge agent
 proposers = [
     Agent(name=f"proposer_{i}", model="gemini-2.5-pro",
-          description=f"Proposer agent {i}", instruction="Propose one concise solution for the prompt with a one-line rationale.")
+          description=f"Proposer agent {i}", instruction="Propose one concise solution for the prompt with a one-line rationale.",
+          before_model_callback=prefix_cache.before_model_callback,
+          after_model_callback=prefix_cache.after_model_callback)
     for i in range(1,4)
 ]
 
@@ -73,6 +82,8 @@ async def negotiation_flow(prompt):
     jresp = await r_judge.run_debug(judge_prompt)
     print("\n--- Judge decision ---")
     await handle_resp(jresp)
+    if prefix_cache.enabled:
+        print("\nContext cache stats:", prefix_cache.stats)
 
 if __name__ == "__main__":
     asyncio.run(negotiation_flow("How can we improve first-time user activation on a learning platform?"))
\ No newline at end of file
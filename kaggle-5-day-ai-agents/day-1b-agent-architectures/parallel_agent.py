@@ -1,5 +1,5 @@
 # parallel_agent.py
-import os, asyncio
+import os, sys, asyncio
 from dotenv import load_dotenv
 load_dotenv()
 
@@ -12,6 +12,10 @@ os.environ["GOOGLE_GENAI_USE_VERTEXAI"] = os.getenv("GOOGLE_GENAI_USE_VERTEXAI",
 from google.adk.agents import Agent
 from google.adk.runners import InMemoryRunner
 
+# shared staged pipeline runtime (worker pools connected by bounded queues)
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from staged_pipeline import Stage, StagedPipeline
+
 def extract_text_from_obj(obj):
     try:
         if isinstance(obj, str): return obj
@@ -50,8 +54,15 @@ engineer = Agent(name="engineer", model="gemini-2.5-pro",
 r_research = InMemoryRunner(agent=researcher, app_name="agents")
 r_engineer = InMemoryRunner(agent=engineer, app_name="agents")
 
-async def pipeline_instance(goal, seed):
+# Stage capacity (tune each independently; the slowest stage sets throughput)
+RESEARCH_WORKERS = int(os.getenv("RESEARCH_WORKERS", "3"))
+ENGINEER_WORKERS = int(os.getenv("ENGINEER_WORKERS", "3"))
+QUEUE_SIZE = int(os.getenv("PIPELINE_QUEUE_SIZE", "4"))
+
+# Stages: each takes the item dict from the previous stage and returns it enriched
+async def research_stage(item):
     # step A: researcher propose hypothesis
+    goal, seed = item["goal"], item["seed"]
     h_resp = await r_research.run_debug(f"Goal: {goal}\nSeed: {seed}\nPropose one hypothesis.")
     # extract text quickly
     h_text = ""
@@ -60,18 +71,25 @@ async def pipeline_instance(goal, seed):
     else:
         h_text = extract_text_from_obj(h_resp)
     print(f"\n[Pipeline {seed}] Hypothesis:", h_text)
+    return {**item, "hypothesis": h_text}
 
+async def engineer_stage(item):
     # step B: engineer creates plan for that hypothesis
-    e_resp = await r_engineer.run_debug(f"Hypothesis: {h_text}\nProduce 2-step plan.")
+    e_resp = await r_engineer.run_debug(f"Hypothesis: {item['hypothesis']}\nProduce 2-step plan.")
     await handle_resp(e_resp)
-    return (seed, h_text)
+    return item
 
 async def main():
     goal = "Reduce time-to-first-success for new tutorial users."
-    # spawn 3 pipelines in parallel
-    tasks = [pipeline_instance(goal, i) for i in range(1,4)]
-    results = await asyncio.gather(*tasks)
+    # researcher and engineer pools overlap across seeds (add an evaluator Stage here to extend)
+    pipeline = StagedPipeline([
+        Stage("researcher", research_stage, workers=RESEARCH_WORKERS),
+        Stage("engineer", engineer_stage, workers=ENGINEER_WORKERS),
+    ], queue_size=QUEUE_SIZE)
+    items = await pipeline.run({"goal": goal, "seed": i} for i in range(1,4))
+    results = [(it["seed"], it["hypothesis"]) if isinstance(it, dict) else it for it in items]
     print("\nAll pipelines done. Collected hypotheses:", results)
+    pipeline.print_metrics()
 
 if __name__ == "__main__":
     asyncio.run(main())
\ No newline at end of file
@@ -1,5 +1,5 @@
 # sequential_agent.py
-import os, asyncio
+import os, sys, asyncio
 from dotenv import load_dotenv
 load_dotenv()
 
@@ -11,9 +11,12 @@ os.environ["GOOGLE_GENAI_USE_VERTEXAI"] = os.getenv("GOOGLE_GENAI_USE_VERTEXAI",
 
 from google.adk.agents import Agent
 from google.adk.runners import InMemoryRunner
-from google.adk.tools import google_search
 from google.genai import types
 
+# shared local retrieval tool (set USE_LOCAL_SEARCH=TRUE to search the local index instead of the web)
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from local_retrieval import local_search, use_local_search
+
 # Helpers
 def extract_text_from_obj(obj):
     try:
@@ -49,7 +52,9 @@ researcher = Agent(
     name="researcher",
     model="gemini-2.5-pro",
     description="Researcher: reads prompt & proposes 2 hypotheses.",
-    instruction="You are a Researcher. Propose 2 concise hypotheses for the user goal, ranked by feasibility."
+    instruction="You are a Researcher. Propose 2 concise hypotheses for the user goal, ranked by feasibility.",
+    # no tools by default; with USE_LOCAL_SEARCH=TRUE the researcher can consult the local corpus
+    tools=[local_search] if use_local_search() else [],
 )
 
 engineer = Agent(
@@ -1,12 +1,16 @@
 import os
+import sys
 import asyncio
 from dotenv import load_dotenv
 
 from google.adk.agents import Agent
 from google.adk.runners import InMemoryRunner
-from google.adk.tools import google_search
 from google.adk.tools.function_tool import FunctionTool
 
+# shared local retrieval tool (set USE_LOCAL_SEARCH=TRUE to search the local index instead of the web)
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from local_retrieval import search_tool
+
 # ----------------------------------------------------------------------
 # Load environment and validate API key
 # ----------------------------------------------------------------------
@@ -50,7 +54,7 @@ root_agent = Agent(
         "You are a tool-enabled AI agent. Use the available tools (math, weather, Google Search) "
         "to answer questions accurately. Explain your reasoning where possible."
     ),
-    tools=[math_tool, weather_tool, google_search],
+    tools=[math_tool, weather_tool, search_tool()],
 )
 
 runner = InMemoryRunner(agent=root_agent)
@@ -12,6 +12,7 @@ Demonstrates:
 """
 
 import os
+import sys
 import asyncio
 import logging
 import time
@@ -21,10 +22,14 @@ from dotenv import load_dotenv
 # ADK imports
 from google.adk.agents import Agent
 from google.adk.runners import InMemoryRunner
-from google.adk.tools import google_search
 from google.adk.tools.function_tool import FunctionTool
 from google.genai import types
 
+# shared helpers: local retrieval tool (USE_LOCAL_SEARCH=TRUE) and context-prefix cache (USE_CONTEXT_CACHE=TRUE)
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from local_retrieval import search_tool
+from prefix_cache import get_prefix_cache
+
 # --- Setup logging ---
 logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s: %(message)s")
 
@@ -106,6 +111,8 @@ retry_options = types.HttpRetryOptions(
 run_config = types.RunConfig(retry_options=retry_options, timeout=30)
 
 # --- Agent definition ---
+prefix_cache = get_prefix_cache()  # no-op unless USE_CONTEXT_CACHE=TRUE
+
 root_agent = Agent(
     name="best_practices_agent",
     model="gemini-2.5-flash-lite",
@@ -114,7 +121,11 @@ root_agent = Agent(
         "You are a careful AI assistant. When calling tools, validate inputs, "
         "prefer cached results when available, and always return structured summaries."
     ),
-    tools=[add_tool, extract_number_tool, google_search],
+    tools=[add_tool, extract_number_tool, search_tool()],
+    # instruction + tool declarations are identical on every call: reuse them via context caching
+    # (on their own they are below the API minimum; CONTEXT_CACHE_PINNED supplies a cacheable prefix)
+    before_model_callback=prefix_cache.before_model_callback,
+    after_model_callback=prefix_cache.after_model_callback,
 )
 
 runner = InMemoryRunner(agent=root_agent, app_name="agents", run_config=run_config)
@@ -213,6 +224,8 @@ async def demo():
             time.sleep(1.0)
         except Exception as e:
             logging.error("Demo workflow failed for '%s': %s", q, e)
+    if prefix_cache.enabled:
+        logging.info("Context cache stats: %s", prefix_cache.stats)
 
 if __name__ == "__main__":
     asyncio.run(demo())
\ No newline at end of file
@@ -0,0 +1,454 @@
+# local_retrieval.py
+"""
+Local Retrieval - offline alternative to google_search
+
+Demonstrates:
+ - an on-disk inverted index scored with BM25
+ - memory-mapped postings (read straight from disk, no full load)
+ - incremental document add (each add writes a new immutable segment)
+ - a plain function tool that drops into any agent's tools=[...] list
+
+Usage from the command line:
+   python local_retrieval.py add path/to/docs/        # index .txt / .md / .json files
+   python local_retrieval.py search "agent tool chaining"
+   python local_retrieval.py bench "query one" "query two"
+
+Usage from an agent script:
+   from local_retrieval import local_search
+   agent = Agent(..., tools=[local_search])
+
+The index lives in LOCAL_INDEX_DIR (default: .local_index next to this file).
+"""
+
+import os
+import re
+import sys
+import json
+import math
+import mmap
+import time
+import heapq
+import shutil
+import logging
+import threading
+from array import array
+from contextlib import contextmanager
+from typing import Any, Dict, Iterable, List, Optional
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+DEFAULT_INDEX_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), ".local_index")
+
+# BM25 parameters (standard Robertson/Sparck Jones defaults)
+BM25_K1 = 1.5
+BM25_B = 0.75
+
+# Each posting is (doc_id, term_freq) packed as two native unsigned ints
+# (the index is a local cache, so it is not meant to be portable across machines)
+POSTING_TYPECODE = "I"
+
+_TOKEN_RE = re.compile(r"\w+", re.UNICODE)
+
+
+def tokenize(text: str) -> List[str]:
+    return _TOKEN_RE.findall(text.lower())
+
+
+def _clean_doc(doc: Any) -> Optional[Dict[str, Any]]:
+    """Normalize a document to string id/title/text, or return None (with a warning) if unusable."""
+    if not isinstance(doc, dict) or doc.get("id") is None:
+        logging.warning("Skipping document without an id: %r", doc if not isinstance(doc, dict) else doc.keys())
+        return None
+    text, title = doc.get("text"), doc.get("title")
+    if isinstance(text, (int, float)) and not isinstance(text, bool):
+        text = str(text)
+    if not isinstance(text, str):
+        logging.warning("Skipping document %r: text is %s, not a string", doc["id"], type(text).__name__)
+        return None
+    if title is None:
+        title = ""
+    elif not isinstance(title, str):
+        title = str(title)
+    return {"id": str(doc["id"]), "title": title, "text": text}
+
+
+@contextmanager
+def _file_lock(path: str):
+    # cross-process lock so two writers (agent process + CLI `add`) never race on segment names
+    with open(path, "a+b") as f:
+        if fcntl:
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+        else:
+            f.seek(0)
+            msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+        try:
+            yield
+        finally:
+            if fcntl:
+                fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+            else:
+                f.seek(0)
+                msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+
+
+# --- One immutable segment on disk ---
+class _Segment:
+    """
+    A segment directory holds:
+      postings.bin  - packed (doc_id, tf) pairs, grouped by term
+      lexicon.json  - term -> [offset, count] into postings.bin, plus doc lengths
+      docs.jsonl    - one stored document per line (id, title, text)
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        with open(os.path.join(path, "lexicon.json"), "r", encoding="utf-8") as f:
+            meta = json.load(f)
+        self.doc_base: int = meta["doc_base"]
+        self.doc_lens: List[int] = meta["doc_lens"]
+        self.doc_offsets: List[int] = meta["doc_offsets"]
+        self.terms: Dict[str, List[int]] = meta["terms"]
+
+        self._postings_file = open(os.path.join(path, "postings.bin"), "rb")
+        if os.fstat(self._postings_file.fileno()).st_size:
+            self._mm: Optional[mmap.mmap] = mmap.mmap(
+                self._postings_file.fileno(), 0, access=mmap.ACCESS_READ
+            )
+            self._view: Optional[memoryview] = memoryview(self._mm).cast(POSTING_TYPECODE)
+        else:
+            # mmap refuses zero-length files (segment of empty documents)
+            self._mm = None
+            self._view = None
+
+    def df(self, term: str) -> int:
+        entry = self.terms.get(term)
+        return entry[1] if entry else 0
+
+    def postings(self, term: str) -> memoryview:
+        entry = self.terms.get(term)
+        if not entry or self._view is None:
+            return memoryview(array(POSTING_TYPECODE))
+        offset, count = entry
+        # slicing a memoryview over the mmap does not copy; pages load lazily
+        return self._view[offset * 2:(offset + count) * 2]
+
+    def load_doc(self, doc_id: int) -> Dict[str, Any]:
+        local = doc_id - self.doc_base
+        with open(os.path.join(self.path, "docs.jsonl"), "rb") as f:
+            f.seek(self.doc_offsets[local])
+            return json.loads(f.readline().decode("utf-8"))
+
+    def close(self):
+        if self._view is not None:
+            self._view.release()
+        if self._mm is not None:
+            self._mm.close()
+        self._postings_file.close()
+
+
+def _write_segment(path: str, doc_base: int, docs: List[Dict[str, Any]]):
+    inverted: Dict[str, List[int]] = {}
+    doc_lens: List[int] = []
+    doc_offsets: List[int] = []
+
+    os.mkdir(path)  # raises if it exists: never write into someone else's segment
+    with open(os.path.join(path, "docs.jsonl"), "wb") as f:
+        for local, doc in enumerate(docs):
+            doc_offsets.append(f.tell())
+            f.write((json.dumps(doc, ensure_ascii=False) + "\n").encode("utf-8"))
+            tokens = tokenize(doc["title"] + " " + doc["text"])
+            doc_lens.append(len(tokens))
+            counts: Dict[str, int] = {}
+            for tok in tokens:
+                counts[tok] = counts.get(tok, 0) + 1
+            for tok, tf in counts.items():
+                inverted.setdefault(tok, []).extend((doc_base + local, tf))
+
+    terms: Dict[str, List[int]] = {}
+    buf = array(POSTING_TYPECODE)
+    for term in sorted(inverted):
+        pairs = inverted[term]
+        terms[term] = [len(buf) // 2, len(pairs) // 2]
+        buf.extend(pairs)
+    with open(os.path.join(path, "postings.bin"), "wb") as f:
+        buf.tofile(f)
+
+    meta = {"doc_base": doc_base, "doc_lens": doc_lens, "doc_offsets": doc_offsets, "terms": terms}
+    with open(os.path.join(path, "lexicon.json"), "w", encoding="utf-8") as f:
+        json.dump(meta, f)
+
+
+# --- The index: a manifest of segments ---
+class LocalIndex:
+    """
+    BM25 index over a local corpus. Documents are dicts with "id" and "text"
+    (and an optional "title"). Adding documents never rewrites existing
+    segments; ids already present are skipped (no in-place updates).
+    Several processes may share one index directory: adds are serialized by
+    a lock file and readers pick up new segments when the manifest changes.
+    """
+
+    def __init__(self, index_dir: str = DEFAULT_INDEX_DIR):
+        self.index_dir = index_dir
+        self._lock = threading.Lock()
+        self._segments: List[_Segment] = []
+        self._doc_ids: set = set()
+        self._doc_lens = array(POSTING_TYPECODE)  # indexed by global doc id
+        self._total_len = 0
+        self._manifest_stamp = None
+        self.refresh()
+
+    @property
+    def manifest_path(self) -> str:
+        return os.path.join(self.index_dir, "manifest.json")
+
+    def refresh(self):
+        """Attach segments another process has added since we last read the manifest."""
+        with self._lock:
+            self._refresh_locked()
+
+    def _refresh_locked(self):
+        try:
+            st = os.stat(self.manifest_path)
+        except FileNotFoundError:
+            return
+        stamp = (st.st_mtime_ns, st.st_size)
+        if stamp == self._manifest_stamp:
+            return
+        with open(self.manifest_path, "r", encoding="utf-8") as f:
+            manifest = json.load(f)
+        # segments are append-only, so anything past what we hold is new
+        for name in manifest.get("segments", [])[len(self._segments):]:
+            self._attach(_Segment(os.path.join(self.index_dir, name)))
+        self._doc_ids = set(manifest.get("doc_ids", []))
+        self._manifest_stamp = stamp
+
+    def _attach(self, seg: _Segment):
+        self._segments.append(seg)
+        self._doc_lens.extend(seg.doc_lens)
+        self._total_len += sum(seg.doc_lens)
+
+    def _save_manifest(self):
+        manifest = {
+            "segments": [os.path.basename(s.path) for s in self._segments],
+            "doc_ids": sorted(self._doc_ids),
+        }
+        tmp = self.manifest_path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(manifest, f)
+        os.replace(tmp, self.manifest_path)  # atomic: readers never see half a manifest
+        st = os.stat(self.manifest_path)
+        self._manifest_stamp = (st.st_mtime_ns, st.st_size)
+
+    @property
+    def num_docs(self) -> int:
+        return len(self._doc_lens)
+
+    def add_documents(self, docs: Iterable[Dict[str, Any]]) -> int:
+        # validate before taking any lock or touching disk
+        cleaned = [d for d in map(_clean_doc, docs) if d is not None]
+        os.makedirs(self.index_dir, exist_ok=True)
+        with self._lock, _file_lock(os.path.join(self.index_dir, ".lock")):
+            # another process may have added segments since we last looked
+            self._refresh_locked()
+            fresh = []
+            seen = set()
+            for doc in cleaned:
+                if doc["id"] in self._doc_ids or doc["id"] in seen:
+                    continue
+                seen.add(doc["id"])
+                fresh.append(doc)
+            if not fresh:
+                return 0
+
+            # name from the on-disk manifest; skip leftovers of a crashed writer
+            n = len(self._segments)
+            while os.path.exists(os.path.join(self.index_dir, f"seg_{n:05d}")):
+                n += 1
+            name = f"seg_{n:05d}"
+            path = os.path.join(self.index_dir, name)
+            try:
+                _write_segment(path, self.num_docs, fresh)
+            except Exception:
+                shutil.rmtree(path, ignore_errors=True)
+                raise
+            self._attach(_Segment(path))
+            # only mark ids as indexed once their segment is on disk, so a failed add can be retried
+            self._doc_ids.update(seen)
+            self._save_manifest()
+            logging.info("Indexed %d new documents into %s", len(fresh), name)
+            return len(fresh)
+
+    def add_path(self, path: str) -> int:
+        return self.add_documents(iter_corpus_files(path))
+
+    def search(self, query: str, top_k: int = 5) -> List[Dict[str, Any]]:
+        self.refresh()
+        terms = tokenize(query)
+        n_docs = self.num_docs
+        if not terms or not n_docs:
+            return []
+        avgdl = self._total_len / n_docs
+        doc_len = self._doc_lens
+
+        scores: Dict[int, float] = {}
+        for term in set(terms):
+            df = sum(seg.df(term) for seg in self._segments)
+            if not df:
+                continue
+            idf = math.log(1 + (n_docs - df + 0.5) / (df + 0.5))
+            for seg in self._segments:
+                plist = seg.postings(term)
+                for j in range(0, len(plist), 2):
+                    doc, tf = plist[j], plist[j + 1]
+                    norm = BM25_K1 * (1 - BM25_B + BM25_B * doc_len[doc] / avgdl)
+                    scores[doc] = scores.get(doc, 0.0) + idf * tf * (BM25_K1 + 1) / (tf + norm)
+
+        best = heapq.nlargest(top_k, scores.items(), key=lambda kv: kv[1])
+        results = []
+        for doc, score in best:
+            seg = self._segment_for(doc)
+            stored = seg.load_doc(doc)
+            results.append({
+                "id": stored["id"],
+                "title": stored.get("title", ""),
+                "score": round(score, 4),
+                "snippet": stored["text"][:500],
+            })
+        return results
+
+    def _segment_for(self, doc: int) -> _Segment:
+        for seg in reversed(self._segments):
+            if doc >= seg.doc_base:
+                return seg
+        raise KeyError(doc)
+
+    def close(self):
+        for seg in self._segments:
+            seg.close()
+        self._segments = []
+        self._doc_lens = array(POSTING_TYPECODE)
+        self._total_len = 0
+        self._manifest_stamp = None
+
+
+def iter_corpus_files(path: str) -> Iterable[Dict[str, Any]]:
+    """Yield documents from a file or directory (.txt, .md, .json)."""
+    if os.path.isfile(path):
+        files = [path]
+    else:
+        files = []
+        for root, _, names in os.walk(path):
+            files.extend(os.path.join(root, n) for n in sorted(names))
+    for fp in files:
+        ext = os.path.splitext(fp)[1].lower()
+        if ext in (".txt", ".md"):
+            with open(fp, "r", encoding="utf-8", errors="replace") as f:
+                yield {"id": os.path.abspath(fp), "title": os.path.basename(fp), "text": f.read()}
+        elif ext == ".json":
+            try:
+                with open(fp, "r", encoding="utf-8") as f:
+                    data = json.load(f)
+            except (ValueError, OSError) as e:
+                logging.warning("Skipping unreadable JSON file %s: %s", fp, e)
+                continue
+            # a JSON list of {"id", "text", "title"} records, or any other JSON as one document
+            if isinstance(data, list) and all(isinstance(d, dict) and "text" in d for d in data):
+                for i, d in enumerate(data):
+                    doc = _clean_doc({**d, "id": d.get("id", f"{os.path.abspath(fp)}#{i}")})
+                    if doc is not None:
+                        yield doc
+            else:
+                yield {"id": os.path.abspath(fp), "title": os.path.basename(fp),
+                       "text": json.dumps(data, ensure_ascii=False)}
+
+
+# --- Shared index + function tool ---
+_INDEX: Optional[LocalIndex] = None
+_INDEX_LOCK = threading.Lock()
+
+
+def get_index(index_dir: Optional[str] = None) -> LocalIndex:
+    global _INDEX
+    # read the env var lazily so scripts can call load_dotenv() after importing this module
+    index_dir = index_dir or os.getenv("LOCAL_INDEX_DIR", DEFAULT_INDEX_DIR)
+    with _INDEX_LOCK:
+        if _INDEX is None or _INDEX.index_dir != index_dir:
+            _INDEX = LocalIndex(index_dir)
+        else:
+            # pick up documents added by `python local_retrieval.py add` while we were running
+            _INDEX.refresh()
+        return _INDEX
+
+
+def local_search(query: str) -> dict:
+    """Search the local document corpus and return the most relevant passages.
+
+    Args:
+        query: Keywords or a natural-language question to look up.
+
+    Returns:
+        A dict with "status" and a ranked list of "results" (id, title, score, snippet).
+    """
+    try:
+        index = get_index()
+        if not index.num_docs:
+            return {
+                "status": "error",
+                "error_message": "local index is empty; run `python local_retrieval.py add <path>` first",
+                "results": [],
+            }
+        results = index.search(query, top_k=5)
+    except Exception as e:
+        logging.error("local_search failed: %s", e)
+        return {"status": "error", "error_message": str(e), "results": []}
+    return {"status": "success", "results": results}
+
+
+def use_local_search() -> bool:
+    """True when scripts should swap google_search for local_search (USE_LOCAL_SEARCH=TRUE)."""
+    return os.getenv("USE_LOCAL_SEARCH", "FALSE").upper() == "TRUE"
+
+
+def search_tool():
+    """Return the search tool to plug into tools=[...] for the current environment."""
+    if use_local_search():
+        return local_search
+    from google.adk.tools import google_search
+    return google_search
+
+
+# --- Command line: add / search / bench ---
+def _main(argv: List[str]):
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s: %(message)s")
+    if len(argv) < 2 or argv[0] not in ("add", "search", "bench"):
+        print(__doc__)
+        return
+    cmd, args = argv[0], argv[1:]
+    index = get_index()
+
+    if cmd == "add":
+        for p in args:
+            added = index.add_path(p)
+            print(f"{p}: {added} new documents (total {index.num_docs})")
+    elif cmd == "search":
+        for r in index.search(" ".join(args)):
+            print(f"{r['score']:>8}  {r['title'] or r['id']}")
+            print("          " + r["snippet"][:160].replace("\n", " "))
+    else:
+        rounds = 50
+        start = time.perf_counter()
+        for _ in range(rounds):
+            for q in args:
+                index.search(q)
+        elapsed = time.perf_counter() - start
+        n = rounds * len(args)
+        print(f"{n} queries over {index.num_docs} docs: {elapsed / n * 1000:.3f} ms/query")
+
+
+if __name__ == "__main__":
+    _main(sys.argv[1:])
@@ -0,0 +1,366 @@
+# prefix_cache.py
+"""
+Prefix Cache - reuse the stable part of every model request
+
+Agents resend the same instruction and tool declarations on every call
+(and the three negotiation proposers share one instruction). This module:
+ - builds a key from the stable prefix (model + instruction + tool schema + pinned context)
+ - registers that prefix once with Gemini context caching
+ - reuses the cache handle across calls and across agents, refreshing its TTL
+ - falls back to a normal request when a prefix can't be cached (e.g. too short)
+
+Usage from an agent script:
+   from prefix_cache import get_prefix_cache
+   prefix_cache = get_prefix_cache()
+   agent = Agent(...,
+                 before_model_callback=prefix_cache.before_model_callback,
+                 after_model_callback=prefix_cache.after_model_callback)
+
+Enable with USE_CONTEXT_CACHE=TRUE (CONTEXT_CACHE_TTL sets the TTL in seconds).
+Gemini only caches prefixes above a per-model minimum size (MIN_CACHE_TOKENS),
+and short instructions on their own stay below it. CONTEXT_CACHE_PINNED takes
+comma-separated file paths whose text is pinned to every request as shared
+context (reference docs, style guides...), which is what makes a prefix
+large enough to cache.
+
+LocalCacheBackend is an in-process stand-in; `python prefix_cache.py` runs a
+self-check of the callback path against it (no API key needed).
+"""
+
+import os
+import json
+import time
+import asyncio
+import hashlib
+import logging
+from typing import Any, Dict, List, Optional
+
+# Gemini rejects cached contents below a model-specific minimum token count
+MIN_CACHE_TOKENS = {
+    "gemini-2.5-pro": 4096,
+    "gemini-2.5-flash": 1024,
+    "gemini-2.5-flash-lite": 1024,
+}
+DEFAULT_MIN_TOKENS = 4096  # unknown models: assume the strictest minimum
+DEFAULT_TTL_SECONDS = 3600
+# refresh a handle this many seconds before it would expire
+REFRESH_MARGIN_SECONDS = 60
+
+
+def _to_jsonable(obj: Any) -> Any:
+    if hasattr(obj, "model_dump"):
+        return obj.model_dump(mode="json", exclude_none=True)
+    if isinstance(obj, (list, tuple)):
+        return [_to_jsonable(o) for o in obj]
+    if isinstance(obj, dict):
+        return {k: _to_jsonable(v) for k, v in obj.items()}
+    if isinstance(obj, (str, int, float, bool)) or obj is None:
+        return obj
+    return repr(obj)
+
+
+def min_cache_tokens(model: str) -> int:
+    name = model.rsplit("/", 1)[-1]
+    # longest matching prefix wins, so "gemini-2.5-flash-lite-001" maps to flash-lite
+    for known in sorted(MIN_CACHE_TOKENS, key=len, reverse=True):
+        if name.startswith(known):
+            return MIN_CACHE_TOKENS[known]
+    return DEFAULT_MIN_TOKENS
+
+
+def _is_invalid_argument(error: Exception) -> bool:
+    # google.genai.errors.ClientError carries the HTTP code; 400 means the prefix itself was rejected
+    return getattr(error, "code", None) == 400 or getattr(error, "status", None) == "INVALID_ARGUMENT"
+
+
+def _instruction_text(system_instruction: Any) -> str:
+    # GenerateContentConfig.system_instruction may be a str, a Content or a list of parts
+    if system_instruction is None:
+        return ""
+    if isinstance(system_instruction, str):
+        return system_instruction
+    parts = getattr(system_instruction, "parts", None) or []
+    return "\n\n".join(getattr(p, "text", "") or "" for p in parts)
+
+
+# --- Backends ---
+class GeminiCacheBackend:
+    """Context caching through google-genai (client.aio.caches)."""
+
+    def __init__(self, client=None):
+        if client is None:
+            from google import genai
+            client = genai.Client()
+        self.client = client
+
+    async def create(self, model: str, system_instruction: str, tools: List[Any],
+                     contents: List[Any], ttl_seconds: int) -> str:
+        from google.genai import types
+        cached = await self.client.aio.caches.create(
+            model=model,
+            config=types.CreateCachedContentConfig(
+                system_instruction=system_instruction or None,
+                tools=tools or None,
+                contents=contents or None,
+                ttl=f"{ttl_seconds}s",
+            ),
+        )
+        return cached.name
+
+    async def refresh(self, name: str, ttl_seconds: int):
+        from google.genai import types
+        await self.client.aio.caches.update(
+            name=name, config=types.UpdateCachedContentConfig(ttl=f"{ttl_seconds}s")
+        )
+
+
+class LocalCacheBackend:
+    """In-process stand-in: hands out fake handles and records what was registered."""
+
+    def __init__(self):
+        self.entries: Dict[str, Dict[str, Any]] = {}
+        self.creates = 0
+        self.refreshes = 0
+
+    async def create(self, model, system_instruction, tools, contents, ttl_seconds) -> str:
+        self.creates += 1
+        name = f"cachedContents/local-{self.creates}"
+        self.entries[name] = {
+            "model": model,
+            "system_instruction": system_instruction,
+            "tools": tools,
+            "contents": contents,
+            "expires_at": time.time() + ttl_seconds,
+        }
+        return name
+
+    async def refresh(self, name, ttl_seconds):
+        if name not in self.entries:
+            raise KeyError(name)
+        self.refreshes += 1
+        self.entries[name]["expires_at"] = time.time() + ttl_seconds
+
+
+# --- The cache layer ---
+class ContextPrefixCache:
+    """
+    Maps stable request prefixes to context-cache handles.
+
+    The per-agent identity paragraph ADK adds to the system instruction
+    (it names the agent) is kept out of the cached prefix and sent with the
+    request instead, so agents with the same instruction share one handle.
+    """
+
+    def __init__(self, backend=None, ttl_seconds: int = DEFAULT_TTL_SECONDS,
+                 min_tokens: Optional[int] = None, pinned_context: Optional[List[str]] = None,
+                 enabled: bool = True):
+        self.backend = backend
+        self.ttl_seconds = ttl_seconds
+        self.min_tokens = min_tokens
+        self.pinned_context = list(pinned_context or [])
+        self.enabled = enabled and backend is not None
+        self._handles: Dict[str, Dict[str, Any]] = {}
+        self._uncacheable: set = set()
+        self._locks: Dict[str, asyncio.Lock] = {}
+        self.stats = {
+            "hits": 0, "creates": 0, "refreshes": 0, "fallbacks": 0,
+            "prompt_tokens": 0, "cached_tokens": 0,
+        }
+
+    @staticmethod
+    def prefix_key(model: str, instruction: str, tools: Any, pinned: List[str]) -> str:
+        blob = json.dumps(
+            {"model": model, "instruction": instruction, "tools": _to_jsonable(tools), "pinned": pinned},
+            sort_keys=True,
+        )
+        return hashlib.sha256(blob.encode("utf-8")).hexdigest()
+
+    def _split_instruction(self, text: str, agent_name: str):
+        shared, own = [], []
+        for para in text.split("\n\n"):
+            (own if agent_name and f'"{agent_name}"' in para else shared).append(para)
+        return "\n\n".join(shared), "\n\n".join(own)
+
+    async def get_handle(self, model: str, instruction: str, tools: Any) -> Optional[str]:
+        pinned = self.pinned_context
+        key = self.prefix_key(model, instruction, tools, pinned)
+        if key in self._uncacheable:
+            return None
+        # rough estimate: ~4 characters per token
+        size = len(instruction) + len(json.dumps(_to_jsonable(tools))) + sum(map(len, pinned))
+        min_tokens = min_cache_tokens(model) if self.min_tokens is None else self.min_tokens
+        if size / 4 < min_tokens:
+            self._uncacheable.add(key)
+            return None
+
+        # one lock per prefix so concurrent agents don't register the same prefix twice
+        lock = self._locks.setdefault(key, asyncio.Lock())
+        async with lock:
+            entry = self._handles.get(key)
+            now = time.time()
+            if entry and now < entry["expires_at"] - REFRESH_MARGIN_SECONDS:
+                self.stats["hits"] += 1
+                return entry["name"]
+            if entry and now < entry["expires_at"]:
+                try:
+                    await self.backend.refresh(entry["name"], self.ttl_seconds)
+                    entry["expires_at"] = now + self.ttl_seconds
+                    self.stats["refreshes"] += 1
+                    return entry["name"]
+                except Exception as e:
+                    logging.info("Context cache refresh failed, re-creating: %s", e)
+            try:
+                pinned_contents = [self._user_content(p) for p in pinned]
+                name = await self.backend.create(model, instruction, tools, pinned_contents, self.ttl_seconds)
+            except Exception as e:
+                logging.warning("Context cache create failed, sending full prompt: %s", e)
+                # a rejected prefix stays rejected; transient (network/5xx) errors retry next call
+                if _is_invalid_argument(e):
+                    self._uncacheable.add(key)
+                return None
+            self._handles[key] = {"name": name, "expires_at": now + self.ttl_seconds}
+            self.stats["creates"] += 1
+            return name
+
+    @staticmethod
+    def _user_content(text: str):
+        from google.genai import types
+        return types.Content(role="user", parts=[types.Part(text=text)])
+
+    # --- ADK callbacks ---
+    async def before_model_callback(self, callback_context, llm_request):
+        if not self.enabled:
+            return None
+        config = llm_request.config
+        agent_name = getattr(callback_context, "agent_name", "")
+        shared, own = self._split_instruction(_instruction_text(config.system_instruction), agent_name)
+
+        name = await self.get_handle(llm_request.model, shared, config.tools)
+        if name is None:
+            self.stats["fallbacks"] += 1
+            if self.pinned_context:
+                llm_request.contents[:0] = [self._user_content(p) for p in self.pinned_context]
+            return None
+
+        # the cached content carries instruction + tools; the request must not repeat them
+        config.cached_content = name
+        config.system_instruction = None
+        config.tools = None
+        if own:
+            llm_request.contents.insert(0, self._user_content(own))
+        return None
+
+    async def after_model_callback(self, callback_context, llm_response):
+        usage = getattr(llm_response, "usage_metadata", None)
+        if usage is not None:
+            self.stats["prompt_tokens"] += usage.prompt_token_count or 0
+            self.stats["cached_tokens"] += usage.cached_content_token_count or 0
+        return None
+
+
+# --- Shared instance ---
+_PREFIX_CACHE: Optional[ContextPrefixCache] = None
+
+
+def get_prefix_cache() -> ContextPrefixCache:
+    """Process-wide cache so every agent in a script shares the same handles."""
+    global _PREFIX_CACHE
+    if _PREFIX_CACHE is None:
+        enabled = os.getenv("USE_CONTEXT_CACHE", "FALSE").upper() == "TRUE"
+        pinned = []
+        # pinned files only matter with caching on; don't let a stale path break scripts otherwise
+        paths = os.getenv("CONTEXT_CACHE_PINNED", "") if enabled else ""
+        for path in filter(None, (p.strip() for p in paths.split(","))):
+            try:
+                with open(path, "r", encoding="utf-8") as f:
+                    pinned.append(f.read())
+            except OSError as e:
+                raise ValueError(f"CONTEXT_CACHE_PINNED: cannot read pinned context file {path!r} ({e})") from e
+        _PREFIX_CACHE = ContextPrefixCache(
+            backend=GeminiCacheBackend() if enabled else None,
+            ttl_seconds=int(os.getenv("CONTEXT_CACHE_TTL", DEFAULT_TTL_SECONDS)),
+            pinned_context=pinned,
+            enabled=enabled,
+        )
+    return _PREFIX_CACHE
+
+
+# --- Self-check against the local stand-in ---
+async def _self_check():
+    from types import SimpleNamespace
+
+    def request(agent_name):
+        identity = f'You are an agent. Your internal name is "{agent_name}".'
+        config = SimpleNamespace(
+            system_instruction=identity + "\n\nPropose one concise solution for the prompt.",
+            tools=[{"name": "lookup"}],
+            cached_content=None,
+        )
+        return SimpleNamespace(model="gemini-2.5-pro", config=config, contents=[])
+
+    def ctx(agent_name):
+        return SimpleNamespace(agent_name=agent_name)
+
+    backend = LocalCacheBackend()
+    cache = ContextPrefixCache(backend=backend, ttl_seconds=600, min_tokens=0)
+    try:
+        import google.genai  # noqa: F401
+    except ImportError:
+        cache._user_content = lambda text: {"role": "user", "parts": [{"text": text}]}
+
+    # three proposers with the same instruction share one handle
+    names = [f"proposer_{i}" for i in range(1, 4)]
+    reqs = [request(n) for n in names]
+    await asyncio.gather(*(cache.before_model_callback(ctx(n), r) for n, r in zip(names, reqs)))
+    handles = {r.config.cached_content for r in reqs}
+    assert len(handles) == 1 and None not in handles, handles
+    assert backend.creates == 1, backend.creates
+    entry = backend.entries[handles.pop()]
+    assert "proposer_" not in entry["system_instruction"], entry["system_instruction"]
+    for name, r in zip(names, reqs):
+        assert r.config.system_instruction is None and r.config.tools is None
+        assert len(r.contents) == 1 and name in str(r.contents[0]), r.contents
+    print("ok: 3 proposers -> 1 handle, identity moved into the request")
+
+    # inside the refresh margin the handle's TTL is extended instead of re-created
+    key = next(iter(cache._handles))
+    cache._handles[key]["expires_at"] = time.time() + REFRESH_MARGIN_SECONDS - 1
+    await cache.before_model_callback(ctx("proposer_1"), request("proposer_1"))
+    assert backend.refreshes == 1 and backend.creates == 1, (backend.refreshes, backend.creates)
+    print("ok: refresh after expires_at - REFRESH_MARGIN_SECONDS")
+
+    # past expiry a new handle is registered
+    cache._handles[key]["expires_at"] = time.time() - 1
+    await cache.before_model_callback(ctx("proposer_1"), request("proposer_1"))
+    assert backend.creates == 2, backend.creates
+    print("ok: expired handle re-created")
+
+    # transient create errors fall back once; invalid-argument errors stick
+    class Failing(LocalCacheBackend):
+        def __init__(self, code):
+            super().__init__()
+            self.code = code
+
+        async def create(self, *args):
+            err = RuntimeError(f"HTTP {self.code}")
+            err.code = self.code
+            raise err
+
+    for code, sticky in ((503, False), (400, True)):
+        flaky = ContextPrefixCache(backend=Failing(code), min_tokens=0)
+        flaky._user_content = cache._user_content
+        await flaky.before_model_callback(ctx("proposer_1"), request("proposer_1"))
+        assert bool(flaky._uncacheable) == sticky, (code, flaky._uncacheable)
+    print("ok: only invalid-argument create errors disable caching for a prefix")
+
+    # without pinned context, the default per-model minimum keeps short prefixes uncached
+    strict = ContextPrefixCache(backend=LocalCacheBackend())
+    r = request("proposer_1")
+    await strict.before_model_callback(ctx("proposer_1"), r)
+    assert r.config.cached_content is None and strict.stats["fallbacks"] == 1
+    print(f"ok: short prefix below the {min_cache_tokens('gemini-2.5-pro')}-token minimum is sent normally")
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.ERROR)
+    asyncio.run(_self_check())
@@ -0,0 +1,388 @@
+# sharded_runner.py
+"""
+Sharded Runner - spread agent workloads across CPU cores
+
+Every script runs one asyncio loop in one process, so JSON parsing, text
+extraction and tool execution share a single core. This module:
+ - partitions goals into shards on a local SQLite-backed task queue
+   (a stand-in for a real broker; safe across processes)
+ - starts N worker processes, each with its own event loop and runners
+ - lets idle workers steal pending goals from other shards
+ - re-queues goals from crashed or hung workers and restarts them
+ - aggregates results (return value + printed/logged output) in goal order
+ - benchmarks throughput against the number of workers
+
+Usage:
+   python sharded_runner.py run --target negotiation --workers 4 --goals-file goals.txt
+   python sharded_runner.py run --target sequential --workers 2 "goal one" "goal two"
+   python sharded_runner.py bench --target demo --workers 1,2,4 --goals 64
+
+--target is a preset (sequential, negotiation, chained, demo) or
+"path/to/script.py:async_function". The function is called with one goal.
+"""
+
+import os
+import io
+import sys
+import json
+import time
+import uuid
+import sqlite3
+import asyncio
+import logging
+import argparse
+import importlib.util
+import multiprocessing
+from contextlib import contextmanager, redirect_stdout
+from typing import Any, Dict, List, Optional
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_DB = os.path.join(HERE, ".shard_queue.sqlite")
+
+TARGETS = {
+    "sequential": os.path.join(HERE, "day-1b-agent-architectures", "sequential_agent.py") + ":sequential_pipeline",
+    "negotiation": os.path.join(HERE, "day-1b-agent-architectures", "multi_agent_negotiation.py") + ":negotiation_flow",
+    "chained": os.path.join(HERE, "day-2b-agent-tools", "main.py") + ":chained_workflow",
+    "demo": os.path.abspath(__file__) + ":demo_workload",
+}
+
+MAX_ATTEMPTS = 3
+# consecutive crashes of a worker slot with no task finishing anywhere before we give up on it
+MAX_RESTARTS = 3
+POLL_SECONDS = 0.2
+
+
+# --- SQLite task queue ---
+def _connect(db_path: str) -> sqlite3.Connection:
+    # isolation_level=None: we issue BEGIN IMMEDIATE ourselves to claim tasks atomically
+    conn = sqlite3.connect(db_path, timeout=30, isolation_level=None)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute(
+        """CREATE TABLE IF NOT EXISTS tasks (
+            id INTEGER PRIMARY KEY,
+            run_id TEXT NOT NULL,
+            seq INTEGER NOT NULL,
+            shard INTEGER NOT NULL,
+            payload TEXT NOT NULL,
+            status TEXT NOT NULL DEFAULT 'pending',
+            worker INTEGER,
+            attempts INTEGER NOT NULL DEFAULT 0,
+            started REAL,
+            finished REAL,
+            result TEXT,
+            output TEXT,
+            error TEXT
+        )"""
+    )
+    conn.execute("CREATE INDEX IF NOT EXISTS tasks_claim ON tasks (run_id, status, shard)")
+    return conn
+
+
+def enqueue(conn: sqlite3.Connection, run_id: str, goals: List[Any], shards: int):
+    # round-robin partition; shards only set claim preference, idle workers still steal
+    conn.execute("BEGIN IMMEDIATE")
+    conn.executemany(
+        "INSERT INTO tasks (run_id, seq, shard, payload) VALUES (?, ?, ?, ?)",
+        [(run_id, i, i % shards, json.dumps(g)) for i, g in enumerate(goals)],
+    )
+    conn.execute("COMMIT")
+
+
+def claim(conn: sqlite3.Connection, run_id: str, slot: int) -> Optional[tuple]:
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        row = conn.execute(
+            "SELECT id, payload FROM tasks WHERE run_id = ? AND status = 'pending' "
+            "ORDER BY shard != ?, seq LIMIT 1",
+            (run_id, slot),
+        ).fetchone()
+        if row:
+            conn.execute(
+                "UPDATE tasks SET status = 'running', worker = ?, attempts = attempts + 1, started = ? "
+                "WHERE id = ?",
+                (slot, time.time(), row[0]),
+            )
+        conn.execute("COMMIT")
+    except Exception:
+        conn.execute("ROLLBACK")
+        raise
+    return row
+
+
+def finish(conn: sqlite3.Connection, task_id: int, status: str, result: Any = None,
+           output: str = "", error: str = ""):
+    try:
+        result_json = json.dumps(result)
+    except (TypeError, ValueError):
+        result_json = json.dumps(repr(result))
+    conn.execute(
+        "UPDATE tasks SET status = ?, finished = ?, result = ?, output = ?, error = ? WHERE id = ?",
+        (status, time.time(), result_json, output, error, task_id),
+    )
+
+
+def _requeue_worker(conn: sqlite3.Connection, run_id: str, slot: int, reason: str):
+    conn.execute("BEGIN IMMEDIATE")
+    conn.execute(
+        "UPDATE tasks SET status = 'failed', error = ?, finished = ? "
+        "WHERE run_id = ? AND worker = ? AND status = 'running' AND attempts >= ?",
+        (reason, time.time(), run_id, slot, MAX_ATTEMPTS),
+    )
+    cur = conn.execute(
+        "UPDATE tasks SET status = 'pending', worker = NULL "
+        "WHERE run_id = ? AND worker = ? AND status = 'running'",
+        (run_id, slot),
+    )
+    conn.execute("COMMIT")
+    if cur.rowcount:
+        logging.warning("Worker %d %s; re-queued %d task(s)", slot, reason, cur.rowcount)
+
+
+def _fail_remaining(conn: sqlite3.Connection, run_id: str, reason: str):
+    cur = conn.execute(
+        "UPDATE tasks SET status = 'failed', error = ?, finished = ? "
+        "WHERE run_id = ? AND status IN ('pending', 'running')",
+        (reason, time.time(), run_id),
+    )
+    logging.error("%s; marked %d remaining task(s) failed", reason, cur.rowcount)
+
+
+def _finished(conn: sqlite3.Connection, run_id: str) -> int:
+    return conn.execute(
+        "SELECT COUNT(*) FROM tasks WHERE run_id = ? AND status IN ('done', 'failed')", (run_id,)
+    ).fetchone()[0]
+
+
+def _count(conn: sqlite3.Connection, run_id: str, status: str) -> int:
+    return conn.execute(
+        "SELECT COUNT(*) FROM tasks WHERE run_id = ? AND status = ?", (run_id, status)
+    ).fetchone()[0]
+
+
+# --- Worker process ---
+def load_target(target: str):
+    target = TARGETS.get(target, target)
+    path, _, func = target.rpartition(":")
+    if not path or not func:
+        raise ValueError(f"Target must be 'path/to/script.py:function', got {target!r}")
+    # scripts live in hyphenated folders, so load them by path rather than by package name
+    sys.path.insert(0, os.path.dirname(os.path.abspath(path)))
+    spec = importlib.util.spec_from_file_location(f"shard_target_{os.getpid()}", path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return getattr(module, func)
+
+
+@contextmanager
+def _capture_output(buf: io.StringIO):
+    # targets report through print() and/or logging (day-2b logs everything), so take both;
+    # the root handlers are swapped out so per-task logs don't interleave on the console
+    root = logging.getLogger()
+    handler = logging.StreamHandler(buf)
+    handler.setFormatter(logging.Formatter("%(levelname)s: %(message)s"))
+    saved = root.handlers[:]
+    root.handlers = [handler]
+    try:
+        with redirect_stdout(buf):
+            yield
+    finally:
+        root.handlers = saved
+
+
+async def _worker_loop(db_path: str, run_id: str, slot: int, target: str):
+    fn = load_target(target)
+    conn = _connect(db_path)
+    try:
+        while True:
+            row = claim(conn, run_id, slot)
+            if row is None:
+                return
+            task_id, goal = row[0], json.loads(row[1])
+            out = io.StringIO()
+            try:
+                with _capture_output(out):
+                    result = await fn(goal)
+                finish(conn, task_id, "done", result=result, output=out.getvalue())
+            except Exception as e:
+                # a raised exception is a task failure, not a worker crash: don't retry
+                logging.error("Worker %d failed on goal %r: %s", slot, goal, e)
+                finish(conn, task_id, "failed", output=out.getvalue(), error=repr(e))
+    finally:
+        conn.close()
+
+
+def _worker_main(db_path: str, run_id: str, slot: int, target: str):
+    logging.basicConfig(level=logging.INFO, format=f"%(asctime)s [worker {slot}] %(levelname)s: %(message)s")
+    asyncio.run(_worker_loop(db_path, run_id, slot, target))
+
+
+# --- Coordinator ---
+def run_sharded(target: str, goals: List[Any], workers: int = 2, db_path: str = DEFAULT_DB,
+                task_timeout: Optional[float] = None) -> List[Dict[str, Any]]:
+    """
+    Run `target(goal)` for every goal across `workers` processes and return
+    one record per goal (status, result, output, error, worker, attempts, seconds).
+    """
+    if workers < 1:
+        raise ValueError(f"workers must be at least 1, got {workers}")
+    # import the target here first: a bad path or a script that fails at import (e.g. no
+    # GOOGLE_API_KEY) should raise now, not crash every worker we spawn
+    load_target(target)
+
+    run_id = uuid.uuid4().hex
+    conn = _connect(db_path)
+    enqueue(conn, run_id, goals, workers)
+
+    # spawn: workers start clean instead of inheriting the coordinator's event loop/clients
+    ctx = multiprocessing.get_context("spawn")
+
+    def start(slot):
+        p = ctx.Process(target=_worker_main, args=(db_path, run_id, slot, target), daemon=True)
+        p.start()
+        return p
+
+    procs = {slot: start(slot) for slot in range(workers)}
+    crashes = {slot: 0 for slot in range(workers)}
+    finished_at_start = {slot: 0 for slot in range(workers)}
+    try:
+        while True:
+            pending = _count(conn, run_id, "pending")
+            running = _count(conn, run_id, "running")
+            if not pending and not running:
+                break
+
+            if task_timeout:
+                hung = conn.execute(
+                    "SELECT DISTINCT worker FROM tasks WHERE run_id = ? AND status = 'running' AND started < ?",
+                    (run_id, time.time() - task_timeout),
+                ).fetchall()
+                for (slot,) in hung:
+                    logging.warning("Worker %d exceeded %.0fs task timeout; terminating", slot, task_timeout)
+                    procs[slot].kill()
+                    procs[slot].join()
+                    # requeue now so the task records the real cause, not just "exited with code -9"
+                    _requeue_worker(conn, run_id, slot, f"timed out after {task_timeout:.0f}s")
+
+            for slot, p in procs.items():
+                if p.is_alive() or crashes[slot] >= MAX_RESTARTS:
+                    continue
+                _requeue_worker(conn, run_id, slot, f"exited with code {p.exitcode}")
+                finished = _finished(conn, run_id)
+                if p.exitcode and finished == finished_at_start[slot]:
+                    crashes[slot] += 1
+                    if crashes[slot] >= MAX_RESTARTS:
+                        logging.error("Worker %d crashed %d times without progress; not restarting",
+                                      slot, crashes[slot])
+                        continue
+                else:
+                    crashes[slot] = 0
+                if _count(conn, run_id, "pending"):
+                    finished_at_start[slot] = finished
+                    procs[slot] = start(slot)
+
+            if all(crashes[s] >= MAX_RESTARTS for s in procs):
+                _fail_remaining(conn, run_id, "all workers crashed repeatedly")
+                break
+            time.sleep(POLL_SECONDS)
+
+        rows = conn.execute(
+            "SELECT payload, status, result, output, error, worker, attempts, started, finished "
+            "FROM tasks WHERE run_id = ? ORDER BY seq",
+            (run_id,),
+        ).fetchall()
+    finally:
+        for p in procs.values():
+            p.join(timeout=5)
+            if p.is_alive():
+                p.kill()
+        # also on Ctrl-C / coordinator errors: don't leave this run's rows in the shared queue
+        conn.execute("DELETE FROM tasks WHERE run_id = ?", (run_id,))
+        conn.close()
+
+    return [
+        {
+            "goal": json.loads(payload),
+            "status": status,
+            "result": json.loads(result) if result else None,
+            "output": output or "",
+            "error": error or "",
+            "worker": worker,
+            "attempts": attempts,
+            "seconds": (finished - started) if started and finished else None,
+        }
+        for payload, status, result, output, error, worker, attempts, started, finished in rows
+    ]
+
+
+# --- Offline benchmark workload ---
+async def demo_workload(goal: str):
+    """CPU-bound stand-in for an agent turn: JSON round-trips and text extraction, no network."""
+    events = [{"content": {"parts": [{"text": f"{goal} step {i} " * 20}]}} for i in range(200)]
+    words = 0
+    for _ in range(20):
+        for ev in json.loads(json.dumps(events)):
+            words += len(ev["content"]["parts"][0]["text"].split())
+    return {"goal": goal, "words": words}
+
+
+def benchmark(target: str, goals: List[Any], worker_counts: List[int], db_path: str = DEFAULT_DB):
+    print(f"{'workers':>8} {'seconds':>9} {'goals/s':>9} {'speedup':>8}")
+    base = None
+    for n in worker_counts:
+        start = time.perf_counter()
+        records = run_sharded(target, goals, workers=n, db_path=db_path)
+        elapsed = time.perf_counter() - start
+        failed = sum(r["status"] != "done" for r in records)
+        rate = len(goals) / elapsed
+        base = base or rate
+        note = f"  ({failed} failed)" if failed else ""
+        print(f"{n:>8} {elapsed:>9.2f} {rate:>9.2f} {rate / base:>7.2f}x{note}")
+
+
+def _main(argv: List[str]):
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s: %(message)s")
+    parser = argparse.ArgumentParser(description="Run agent workloads across worker processes.")
+    parser.add_argument("mode", choices=["run", "bench"])
+    parser.add_argument("goals", nargs="*", help="goals to run (or use --goals-file / --goals)")
+    parser.add_argument("--target", default="demo", help="preset name or path/to/script.py:function")
+    parser.add_argument("--workers", default=str(os.cpu_count() or 2),
+                        help="worker count (comma-separated list for bench)")
+    parser.add_argument("--goals-file", help="one goal per line")
+    parser.add_argument("--goals", type=int, default=32, dest="n_goals",
+                        help="number of synthetic goals when none are given")
+    parser.add_argument("--task-timeout", type=float, help="kill and retry a worker stuck on one goal")
+    parser.add_argument("--db", default=DEFAULT_DB)
+    args = parser.parse_intermixed_args(argv)
+
+    goals = list(args.goals)
+    if args.goals_file:
+        with open(args.goals_file, "r", encoding="utf-8") as f:
+            goals += [line.strip() for line in f if line.strip()]
+    if not goals:
+        goals = [f"goal {i}" for i in range(args.n_goals)]
+    worker_counts = [int(w) for w in args.workers.split(",")]
+    if any(n < 1 for n in worker_counts):
+        parser.error(f"--workers must be at least 1, got {args.workers}")
+
+    if args.mode == "bench":
+        benchmark(args.target, goals, worker_counts, db_path=args.db)
+        return
+
+    start = time.perf_counter()
+    records = run_sharded(args.target, goals, workers=worker_counts[0], db_path=args.db,
+                          task_timeout=args.task_timeout)
+    elapsed = time.perf_counter() - start
+    for r in records:
+        print(f"\n=== [{r['status']}] worker {r['worker']} attempts {r['attempts']}: {r['goal']} ===")
+        if r["output"]:
+            print(r["output"].rstrip())
+        if r["result"] is not None:
+            print("Result:", r["result"])
+        if r["error"]:
+            print("Error:", r["error"])
+    done = sum(r["status"] == "done" for r in records)
+    print(f"\n{done}/{len(records)} goals done in {elapsed:.2f}s with {worker_counts[0]} worker(s).")
+
+
+if __name__ == "__main__":
+    _main(sys.argv[1:])